@@ -1,6 +1,13 @@
+import math
+from concurrent.futures import ThreadPoolExecutor
+
 import streamlit as st
 import pandas as pd
 import numpy as np
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+TRADING_DAYS = 252
+SQRT_TRADING_DAYS = math.sqrt(TRADING_DAYS)
 
 st.set_page_config(
     page_title="🧞‍♂️ Geenie - Core Risk + Monte Carlo",
@@ -13,35 +20,44 @@ st.caption("Institutional-grade analytics and forward-looking scenario simulatio
 # -----------------------------
 # How to Use Geenie (User Guide)
 # -----------------------------
-with open("how_to_use_geenie.pdf", "rb") as pdf_file:
-    st.download_button(
-        label="How to Use Geenie - Download User Guide (PDF)",
-        data=pdf_file,
-        file_name="Geenie_User_Guide.pdf",
-        mime="application/pdf",
-    )
+@st.cache_resource
+def load_user_guide():
+    # Read from disk once per server process instead of on every rerun
+    with open("how_to_use_geenie.pdf", "rb") as pdf_file:
+        return pdf_file.read()
+
+st.download_button(
+    label="How to Use Geenie - Download User Guide (PDF)",
+    data=load_user_guide(),
+    file_name="Geenie_User_Guide.pdf",
+    mime="application/pdf",
+)
 
 # -----------------------------
 # CSV Loader
 # -----------------------------
-@st.cache_data
+@st.cache_data(ttl=3600, max_entries=4)
 def load_csv(file):
-    df = pd.read_csv(file)
+    # Arrow's multithreaded reader is much faster on wide files; fall back
+    # to the default engine for CSVs it rejects (e.g. short rows, which the
+    # C engine pads with NaN)
+    try:
+        df = pd.read_csv(file, engine="pyarrow", dtype_backend="pyarrow")
+    except (ImportError, ValueError):
+        file.seek(0)
+        df = pd.read_csv(file)
 
     # Detect date column
     date_col = None
     for col in df.columns:
-        try:
-            parsed = pd.to_datetime(df[col], errors="raise")
-            if parsed.notna().sum() > len(df) * 0.5:
-                date_col = col
-                break
-        except:
-            continue
+        parsed = pd.to_datetime(df[col], errors="coerce")
+        if parsed.notna().mean() > 0.5:
+            df[col] = parsed
+            date_col = col
+            break
     if date_col is None:
         raise ValueError("No valid date column detected.")
 
-    df[date_col] = pd.to_datetime(df[date_col])
     df = df.set_index(date_col).sort_index()
 
     # Detect numeric price columns
@@ -51,6 +67,145 @@ def load_csv(file):
 
     return df, price_cols
 
+# -----------------------------
+# Risk Pipeline
+# -----------------------------
+@st.cache_data(max_entries=16)
+def compute_risk(file_id, _df, price_cols, start_date, end_date):
+    # _df is not hashed; file_id already identifies the uploaded data
+    window = _df.loc[start_date:end_date, list(price_cols)]
+    p = window.to_numpy(dtype=float, na_value=np.nan)
+
+    # One validity mask instead of a chain of dropna() copies
+    complete = ~np.isnan(p).any(axis=1)
+    p = p[complete]
+    index = window.index[complete]
+    if len(price_cols) == 1:
+        asset_name = price_cols[0]
+        price_series = pd.Series(p[:, 0], index=index, name=asset_name)
+    else:
+        asset_name = "Equal-Weighted Portfolio"
+        price_series = pd.Series(p.mean(axis=1), index=index)
+    p = price_series.to_numpy()
+
+    # Core Risk Metrics (plain NumPy; Series only where they are charted)
+    r = np.diff(p) / p[:-1]
+    returns = pd.Series(r, index=index[1:])
+    mean_return = r.mean()
+    daily_volatility = r.std(ddof=1)
+    annual_return = (1 + mean_return) ** TRADING_DAYS - 1
+    annual_volatility = daily_volatility * SQRT_TRADING_DAYS
+
+    dd = p / np.maximum.accumulate(p) - 1
+    drawdown = pd.Series(dd, index=index)
+    max_drawdown = dd.min()
+    down_days_pct = (r < 0).mean() * 100
+
+    # Rolling Volatility & Regime
+    # pandas' default rolling std is already a single O(n) online pass;
+    # engine="numba" measured no faster here and adds a JIT compile per process
+    rolling_vol = returns.rolling(TRADING_DAYS).std() * SQRT_TRADING_DAYS
+    valid = ~np.isnan(rolling_vol.to_numpy())
+    rolling_vol = rolling_vol[valid]
+    vol_threshold = rolling_vol.median()
+    regime_returns = r[valid]
+    high_vol = rolling_vol.to_numpy() > vol_threshold
+    regime_stats = pd.DataFrame(
+        [
+            (regime, regime_returns[mask].mean(), regime_returns[mask].std(ddof=1), int(mask.sum()))
+            for regime, mask in (("High Volatility", high_vol), ("Low Volatility", ~high_vol))
+            if mask.any()
+        ],
+        columns=["Regime", "mean", "std", "count"],
+    ).set_index("Regime")
+
+    return {
+        "asset_name": asset_name,
+        "price_series": price_series,
+        "mean_return": mean_return,
+        "daily_volatility": daily_volatility,
+        "annual_return": annual_return,
+        "annual_volatility": annual_volatility,
+        "drawdown": drawdown,
+        "max_drawdown": max_drawdown,
+        "down_days_pct": down_days_pct,
+        "rolling_vol": rolling_vol,
+        "regime_stats": regime_stats,
+    }
+
+# -----------------------------
+# Chart Downsampling
+# -----------------------------
+@st.cache_data(max_entries=32, show_spinner=False)
+def downsample(series, n_points=2000):
+    # Largest-Triangle-Three-Buckets: keeps the point in each bucket that
+    # forms the largest triangle with its neighbours, so peaks and troughs
+    # survive while the browser receives at most n_points values
+    n = len(series)
+    if n <= n_points:
+        return series
+
+    x = np.arange(n, dtype=float)
+    y = series.to_numpy(dtype=float)
+    every = (n - 2) / (n_points - 2)
+
+    selected = np.empty(n_points, dtype=np.int64)
+    selected[0] = a = 0
+    for i in range(n_points - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+
+        area = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    selected[-1] = n - 1
+
+    return series.iloc[selected]
+
+# -----------------------------
+# Monte Carlo Kernel
+# -----------------------------
+@st.cache_resource
+def load_mc_kernel():
+    # Built once per server process so reruns don't pay the JIT compile again
+    from numba import njit
+
+    # nogil lets the per-horizon simulations run on separate threads;
+    # cache=True keeps the compiled kernel on disk across server restarts
+    @njit(nogil=True, fastmath=True, cache=True)
+    def mc_percentiles(rng, last_price, mu, sigma, days, n_sims, q):
+        # Geometric Brownian motion: log-returns carry the -sigma^2/2 drift correction
+        log_drift = mu - 0.5 * sigma ** 2
+
+        # Step every simulation forward one day at a time and reduce that
+        # day's cross-section straight away, so memory stays O(n_sims)
+        # instead of holding the full (n_sims, days) path matrix
+        log_prices = np.full(n_sims, np.log(last_price))
+        prices = np.empty(n_sims)
+        out = np.empty((q.shape[0], days))
+        for t in range(days):
+            for i in range(n_sims):
+                log_prices[i] += log_drift + sigma * rng.standard_normal()
+                prices[i] = np.exp(log_prices[i])
+            out[:, t] = np.percentile(prices, q)
+        return out
+
+    return mc_percentiles
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def run_mc(last_price, mu, sigma, days, n_sims, seed):
+    # Returns the 5th/50th/95th percentile paths as a (3, days) array
+    # A fresh stream per call keeps the cached result a pure function of seed
+    rng = np.random.Generator(np.random.PCG64DXSM(seed))
+    q = np.array([5.0, 50.0, 95.0])
+    return load_mc_kernel()(rng, last_price, mu, sigma, days, n_sims, q)
+
 # -----------------------------
 # Sidebar
 # -----------------------------
@@ -77,41 +232,29 @@ start_date, end_date = st.sidebar.date_input(
 start_date = pd.Timestamp(start_date)
 end_date = pd.Timestamp(end_date)
 
-df = df.loc[start_date:end_date]
-
-# Prices series
-prices = df[price_cols].dropna()
-if len(price_cols) == 1:
-    asset_name = price_cols[0]
-    price_series = prices[asset_name]
-else:
-    asset_name = "Equal-Weighted Portfolio"
-    price_series = prices.mean(axis=1)
-
 # -----------------------------
 # Core Risk Metrics
 # -----------------------------
-returns = price_series.pct_change().dropna()
-annual_return = (1 + returns.mean()) ** 252 - 1
-annual_volatility = returns.std() * np.sqrt(252)
+# Cached separately so widget changes that don't touch the data
+# (e.g. the simulation slider) skip the whole risk pipeline
+risk = compute_risk(uploaded_file.file_id, df, tuple(price_cols), start_date, end_date)
+asset_name = risk["asset_name"]
+price_series = risk["price_series"]
+annual_return = risk["annual_return"]
+annual_volatility = risk["annual_volatility"]
+drawdown = risk["drawdown"]
+max_drawdown = risk["max_drawdown"]
+down_days_pct = risk["down_days_pct"]
+rolling_vol = risk["rolling_vol"]
+regime_stats = risk["regime_stats"]
 
-drawdown = price_series / price_series.cummax() - 1
-max_drawdown = drawdown.min()
-down_days_pct = (returns < 0).mean() * 100
-
-# -----------------------------
-# Rolling Volatility & Regime
-# -----------------------------
-rolling_vol = returns.rolling(252).std() * np.sqrt(252)
-vol_threshold = rolling_vol.median()
-regime = np.where(rolling_vol > vol_threshold, "High Volatility", "Low Volatility")
-regime_df = pd.DataFrame({"Returns": returns, "Volatility": rolling_vol, "Regime": regime}).dropna()
-regime_stats = regime_df.groupby("Regime")["Returns"].agg(["mean", "std", "count"])
+df = df.loc[start_date:end_date]
 
 # -----------------------------
 # Stress Periods (>30%)
 # -----------------------------
-stress_periods = drawdown[drawdown < -0.3]
+stress_mask = drawdown.to_numpy() < -0.3
+n_stress = int(stress_mask.sum())
 
 # -----------------------------
 # Display Metrics
@@ -141,21 +284,21 @@ st.write("Returns by volatility regime:")
 st.dataframe(regime_stats.style.format("{:.4f}"))
 
 st.subheader("📉 Rolling Volatility (252-day)")
-st.line_chart(rolling_vol.dropna())
+st.line_chart(downsample(rolling_vol))
 
 st.subheader("⚠️ Stress Periods (Drawdown < -30%)")
-st.write(f"Number of stress days: {len(stress_periods)}")
-if len(stress_periods) > 0:
-    st.line_chart(stress_periods)
+st.write(f"Number of stress days: {n_stress}")
+if n_stress > 0:
+    st.line_chart(downsample(drawdown[stress_mask]))
 
 # -----------------------------
 # Price & Drawdown Charts
 # -----------------------------
 st.subheader("📈 Price Evolution")
-st.line_chart(price_series)
+st.line_chart(downsample(price_series))
 
 st.subheader("📉 Drawdown Profile")
-st.area_chart(drawdown)
+st.area_chart(downsample(drawdown))
 
 # -----------------------------
 # Monte Carlo Scenario Testing Explanation
@@ -177,30 +320,34 @@ These charts give a **range of possible outcomes**, not a single prediction.
 st.subheader("📊 Multi-Horizon Forward Price Projections")
 
 num_simulations = st.sidebar.slider("Number of Simulations", 100, 5000, 1000)
+seed = st.sidebar.number_input("Random Seed", min_value=0, max_value=2**31 - 1, value=42, step=1)
 last_price = price_series.iloc[-1]
-mean_return = returns.mean()
-vol = returns.std()
+mean_return = risk["mean_return"]
+vol = risk["daily_volatility"]
 
 forecast_horizons = {
     "Next Day": 1,
     "Next Month (~21 trading days)": 21,
-    "Next Year (~252 trading days)": 252,
-    "Next 5 Years (~1260 trading days)": 252*5
+    "Next Year (~252 trading days)": TRADING_DAYS,
+    "Next 5 Years (~1260 trading days)": TRADING_DAYS*5
 }
 
-for label, days in forecast_horizons.items():
-    all_paths = []
-    for _ in range(num_simulations):
-        simulated_returns = np.random.normal(mean_return, vol, days)
-        path = last_price * np.cumprod(1 + simulated_returns)
-        all_paths.append(path)
-
-    all_paths = np.array(all_paths)
-    p5 = np.percentile(all_paths, 5, axis=0)
-    p50 = np.percentile(all_paths, 50, axis=0)
-    p95 = np.percentile(all_paths, 95, axis=0)
-
-    if label == "Next Day":
+# Horizons are independent, so simulate them concurrently. The 5-year
+# horizon is most of the work, so this overlaps the shorter ones with it
+# (at most ~1.2x), not a per-core speedup. Workers get the script context
+# so the cached run_mc behaves as it does on the main thread
+with ThreadPoolExecutor(
+    max_workers=len(forecast_horizons),
+    initializer=add_script_run_ctx,
+    initargs=(None, get_script_run_ctx()),
+) as pool:
+    projections = list(pool.map(
+        lambda days: run_mc(last_price, mean_return, vol, days, num_simulations, int(seed)),
+        forecast_horizons.values(),
+    ))
+
+for (label, days), (p5, p50, p95) in zip(forecast_horizons.items(), projections):
+    if days == 1:
         # Display as text
         st.markdown(f"### {label} Price Projection (Text)")
         st.write(